@@ -1,9 +1,13 @@
 import os
-from typing import Optional
-from pydantic_settings import BaseSettings
+from functools import lru_cache
+from typing import List, Optional
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
     # Azure OpenAI Configuration
     azure_openai_api_key: str
     azure_openai_endpoint: str
@@ -13,36 +17,57 @@ class Settings(BaseSettings):
     
     # Weaviate Configuration
     weaviate_url: str = "http://localhost:8080"
+    weaviate_grpc_port: int = 50051
+    # Product quantization compresses stored vectors once training_limit vectors exist
+    # (needs ASYNC_INDEXING=true on the Weaviate server); segments must divide the dimensions
+    weaviate_pq_enabled: bool = True
+    weaviate_pq_segments: int = 96  # 1536-dim ada-002 vectors -> 16 dims per segment
+    weaviate_pq_training_limit: int = 100_000
     
     # HeyGen Configuration
     heygen_api_key: str
     heygen_avatar_id: str = "default"
     heygen_voice_id: str = "default"
+    heygen_cache_ttl: int = 600  # seconds to cache avatar/voice listings
     
     # Application Configuration
     app_name: str = "RAG Chatbot"
     app_version: str = "1.0.0"
     debug: bool = False
+    # Skip the OpenAPI schema and /docs routes (faster cold starts in serverless/tests)
+    fastapi_openapi_defer_build: bool = False
     
     # CORS Configuration
-    cors_origins: list = ["http://localhost:3000", "http://localhost:3001", "http://localhost:3002"]
-    # cors_origins: list = ["*"]
+    cors_origins: List[str] = Field(
+        default_factory=lambda: ["http://localhost:3000", "http://localhost:3001", "http://localhost:3002"]
+    )
+    # cors_origins: List[str] = Field(default_factory=lambda: ["*"])
     
     # File Upload Configuration
     max_file_size: int = 10 * 1024 * 1024  # 10MB
-    allowed_file_types: list = [".pdf", ".txt", ".md", ".docx"]
+    allowed_file_types: List[str] = Field(default_factory=lambda: [".pdf", ".txt", ".md", ".docx"])
+    
+    # Chunking Configuration (sizes in cl100k_base tokens, ~4 characters each)
+    chunk_size: int = 250
+    chunk_overlap: int = 50
     
-    # Chunking Configuration
-    chunk_size: int = 1000
-    chunk_overlap: int = 200
+    # Embedding Configuration
+    embedding_batch_size: int = 64  # texts per embeddings request
+    embedding_concurrency: int = 8  # embeddings requests in flight at once
     
     # RAG Configuration
     max_retrieved_docs: int = 5
+    retrieval_cache_size: int = 512  # cached query results, 0 disables
+    retrieval_cache_ttl: int = 60  # seconds before cached results expire (picks up writes from other processes)
+    query_embedding_cache_size: int = 4096  # cached query embeddings, 0 disables
     temperature: float = 0.7
     max_tokens: int = 1000
 
-    class Config:
-        env_file = ".env"
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load settings once and reuse them for the lifetime of the process"""
+    return Settings()
 
 
-settings = Settings() 
\ No newline at end of file
+settings = get_settings() 
\ No newline at end of file
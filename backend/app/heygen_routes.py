@@ -1,23 +1,92 @@
 from fastapi import APIRouter, HTTPException
-import requests
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import httpx
 import logging
+import time
 from app.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+HEYGEN_HEADERS = {
+    "x-api-key": settings.heygen_api_key,
+    "Content-Type": "application/json"
+}
+
+# Shared HTTP client, opened and closed by the application lifespan
+_client: Optional[httpx.AsyncClient] = None
+
+# Avatar/voice listings rarely change, so cache them as {url: (expires_at, data)}
+_catalogue_cache: Dict[str, Tuple[float, Any]] = {}
+# One lock per URL so a miss on one listing never delays hits or misses on another
+_catalogue_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def open_heygen_client():
+    """Create the shared HeyGen HTTP client"""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            # Keep a small pool of keep-alive connections so repeat calls skip the TLS handshake,
+            # and retry failed connection attempts
+            transport=httpx.AsyncHTTPTransport(
+                retries=2,
+                limits=httpx.Limits(max_connections=8, max_keepalive_connections=4)
+            ),
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            headers=HEYGEN_HEADERS
+        )
+
+
+async def close_heygen_client():
+    """Close the shared HeyGen HTTP client"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_heygen_client() -> httpx.AsyncClient:
+    """Get the shared HeyGen HTTP client"""
+    if _client is None:
+        raise RuntimeError("HeyGen client is not initialized")
+    return _client
+
+
+async def _get_catalogue(url: str, name: str) -> Any:
+    """Fetch a HeyGen listing, serving it from the TTL cache when fresh"""
+    cached = _catalogue_cache.get(url)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    
+    async with _catalogue_locks.setdefault(url, asyncio.Lock()):
+        # Another request may have refreshed the entry while this one waited for the lock
+        cached = _catalogue_cache.get(url)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        
+        response = await get_heygen_client().get(url)
+        
+        if response.status_code != 200:
+            logger.error(f"Failed to list {name}: {response.status_code} - {response.text}")
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Failed to list {name}: {response.text}"
+            )
+        
+        data = response.json()
+        _catalogue_cache[url] = (time.monotonic() + settings.heygen_cache_ttl, data)
+        return data
+
 
 @router.post("/heygen/token")
 async def create_heygen_token():
     """Create a HeyGen access token for streaming avatar"""
     try:
         url = "https://api.heygen.com/v1/streaming.create_token"
-        headers = {
-            "x-api-key": settings.heygen_api_key,
-            "Content-Type": "application/json"
-        }
         
-        response = requests.post(url, headers=headers)
+        response = await get_heygen_client().post(url)
         
         if response.status_code == 200:
             data = response.json()
@@ -33,7 +102,7 @@ async def create_heygen_token():
                 detail=f"Failed to create HeyGen token: {response.text}"
             )
             
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Request error creating HeyGen token: {e}")
         raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
     except Exception as e:
@@ -45,24 +114,9 @@ async def create_heygen_token():
 async def list_avatars():
     """List available HeyGen avatars"""
     try:
-        url = "https://api.heygen.com/v2/avatars"
-        headers = {
-            "x-api-key": settings.heygen_api_key,
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            logger.error(f"Failed to list avatars: {response.status_code} - {response.text}")
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed to list avatars: {response.text}"
-            )
+        return await _get_catalogue("https://api.heygen.com/v2/avatars", "avatars")
             
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Request error listing avatars: {e}")
         raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
     except Exception as e:
@@ -74,24 +128,9 @@ async def list_avatars():
 async def list_voices():
     """List available HeyGen voices"""
     try:
-        url = "https://api.heygen.com/v2/voices"
-        headers = {
-            "x-api-key": settings.heygen_api_key,
-            "Content-Type": "application/json"
-        }
-        
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            logger.error(f"Failed to list voices: {response.status_code} - {response.text}")
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Failed to list voices: {response.text}"
-            )
+        return await _get_catalogue("https://api.heygen.com/v2/voices", "voices")
             
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Request error listing voices: {e}")
         raise HTTPException(status_code=500, detail=f"Network error: {str(e)}")
     except Exception as e:
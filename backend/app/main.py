@@ -1,22 +1,25 @@
 import logging
 from fastapi import FastAPI, HTTPException, UploadFile, File, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.datastructures import Headers
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from typing import List
 import uvicorn
 import os
-import tempfile
-import json
+import orjson
 
 from app.config import settings
 from models.schemas import (
     ChatRequest, ChatResponse, IngestRequest, IngestResponse,
     ErrorResponse
 )
-from services.document_service import document_service
-from services.azure_openai_client import azure_openai_client
-from services.weaviate_client import weaviate_client
-from app.heygen_routes import router as heygen_router
+from app.heygen_routes import (
+    router as heygen_router,
+    open_heygen_client,
+    close_heygen_client
+)
 
 # Configure logging
 logging.basicConfig(
@@ -25,14 +28,77 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Read uploads in 64KB pieces rather than loading them whole
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Allowance for multipart framing (boundaries, part headers) on top of max_file_size
+UPLOAD_OVERHEAD_ALLOWANCE = 64 * 1024
+
+
+# Service modules pull in the OpenAI/Weaviate/LangChain stacks and connect on
+# import, so load them on first use instead of at application import time
+@lru_cache(maxsize=1)
+def _document_service():
+    from services.document_service import document_service
+    return document_service
+
+
+@lru_cache(maxsize=1)
+def _azure_openai_client():
+    from services.azure_openai_client import azure_openai_client
+    return azure_openai_client
+
+
+@lru_cache(maxsize=1)
+def _weaviate_client():
+    from services.weaviate_client import weaviate_client
+    return weaviate_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared HTTP clients on startup and close them on shutdown"""
+    await open_heygen_client()
+    try:
+        yield
+    finally:
+        await close_heygen_client()
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
-    description="RAG Chatbot with Voice using Azure OpenAI + Weaviate"
+    description="RAG Chatbot with Voice using Azure OpenAI + Weaviate",
+    openapi_url=None if settings.fastapi_openapi_defer_build else "/openapi.json",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# Add CORS middleware
+
+class UploadSizeLimitMiddleware:
+    """Reject file uploads whose declared Content-Length is too large before the body is read"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Plain ASGI so other routes (notably the /chat stream) pass straight through
+        if scope["type"] == "http" and scope["path"] == "/ingest/file":
+            content_length = Headers(scope=scope).get("content-length", "")
+            if content_length.isdigit() and int(content_length) > settings.max_file_size + UPLOAD_OVERHEAD_ALLOWANCE:
+                response = ORJSONResponse(
+                    status_code=413,
+                    content={"detail": f"File size exceeds maximum allowed size of {settings.max_file_size} bytes"}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware)
+
+
+# Add CORS middleware (added last so it also wraps responses from the middleware above)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,
@@ -60,7 +126,7 @@ async def health_check():
     """Health check endpoint"""
     try:
         # Check Weaviate connection
-        doc_count = weaviate_client.get_document_count()
+        doc_count = _weaviate_client().get_document_count()
         
         return {
             "status": "healthy",
@@ -81,7 +147,7 @@ async def ingest_text(request: IngestRequest):
             raise HTTPException(status_code=400, detail="Text content is required")
         
         filename = request.filename or "text_input"
-        result = document_service.ingest_text_content(
+        result = await _document_service().aingest_text_content(
             text_content=request.text_content,
             filename=filename
         )
@@ -115,39 +181,32 @@ async def ingest_file(file: UploadFile = File(...)):
                 detail=f"File type {file_extension} not supported. Allowed types: {settings.allowed_file_types}"
             )
         
-        # Check file size
-        file_content = await file.read()
-        if len(file_content) > settings.max_file_size:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"File size exceeds maximum allowed size of {settings.max_file_size} bytes"
-            )
+        # Read the upload in pieces, rejecting it as soon as it exceeds the size limit
+        # (covers chunked requests that carry no Content-Length)
+        file_content = bytearray()
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            file_content += chunk
+            if len(file_content) > settings.max_file_size:
+                raise HTTPException(
+                    status_code=413, 
+                    detail=f"File size exceeds maximum allowed size of {settings.max_file_size} bytes"
+                )
         
-        # Save file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-            temp_file.write(file_content)
-            temp_file_path = temp_file.name
+        # Ingest the document straight from memory
+        result = await _document_service().aingest_bytes(
+            data=file_content,
+            filename=file.filename
+        )
         
-        try:
-            # Ingest the document
-            result = document_service.ingest_document(
-                file_path=temp_file_path,
-                filename=file.filename
-            )
-            
-            if not result["success"]:
-                raise HTTPException(status_code=500, detail=result["message"])
-            
-            return IngestResponse(
-                success=True,
-                message=result["message"],
-                document_id=result.get("document_ids", [None])[0] if result.get("document_ids") else None,
-                chunks_created=result["chunks_created"]
-            )
-            
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+        if not result["success"]:
+            raise HTTPException(status_code=500, detail=result["message"])
+        
+        return IngestResponse(
+            success=True,
+            message=result["message"],
+            document_id=result.get("document_ids", [None])[0] if result.get("document_ids") else None,
+            chunks_created=result["chunks_created"]
+        )
         
     except HTTPException:
         raise
@@ -161,23 +220,19 @@ async def chat_stream(request: ChatRequest):
     """Chat endpoint with streaming response"""
     try:
         # Retrieve relevant documents
-        relevant_docs = document_service.retrieve_relevant_documents(request.message)
+        relevant_docs = _document_service().retrieve_relevant_documents(request.message)
         
         # Create RAG prompt
-        messages = azure_openai_client.create_rag_prompt(request.message, relevant_docs)
+        system_message, user_message = _azure_openai_client().create_rag_prompt(request.message, relevant_docs)
         
-        # Add conversation history if provided
+        # Combine system prompt, conversation history, and current query
+        messages = [system_message]
         if request.conversation_history:
-            # Insert conversation history before the current query
-            history_messages = []
-            for msg in request.conversation_history[-10:]:  # Limit to last 10 messages
-                history_messages.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
-            
-            # Combine system prompt, history, and current query
-            messages = [messages[0]] + history_messages + [messages[1]]
+            messages.extend(
+                {"role": msg.role, "content": msg.content}
+                for msg in request.conversation_history[-10:]  # Limit to last 10 messages
+            )
+        messages.append(user_message)
         
         if request.stream:
             # Streaming response
@@ -188,37 +243,37 @@ async def chat_stream(request: ChatRequest):
                         "sources": [doc["metadata"]["filename"] for doc in relevant_docs]
                     }
                     logger.info("📚 Sending sources")
-                    yield f"data: {json.dumps(response_data)}\n\n"
+                    yield b"data: " + orjson.dumps(response_data) + b"\n\n"
                     
                     chunk_count = 0
-                    async for chunk in azure_openai_client.chat_completion_stream(
+                    async for chunk in _azure_openai_client().chat_completion_stream(
                         messages=messages,
                         temperature=settings.temperature,
                         max_tokens=settings.max_tokens
                     ):
                         chunk_count += 1
-                        logger.info(f"📝 SSE: Sending chunk #{chunk_count}: '{chunk}'")
-                        yield f"data: {json.dumps({'content': chunk})}\n\n"
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(f"📝 SSE: Sending chunk #{chunk_count}: '{chunk}'")
+                        yield b"data: " + orjson.dumps({"content": chunk}) + b"\n\n"
                     
                     logger.info(f"✅ SSE: Completed with {chunk_count} chunks")
-                    yield "data: [DONE]\n\n"
+                    yield b"data: [DONE]\n\n"
                     
                 except Exception as e:
                     logger.error(f"Error in streaming response: {e}")
-                    yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                    yield b"data: " + orjson.dumps({"error": str(e)}) + b"\n\n"
             
             return StreamingResponse(
                 generate_response(),
-                media_type="text/plain",
+                media_type="text/event-stream",
                 headers={
                     "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "Content-Type": "text/event-stream"
+                    "Connection": "keep-alive"
                 }
             )
         else:
             # Non-streaming response
-            response_content = azure_openai_client.chat_completion(
+            response_content = _azure_openai_client().chat_completion(
                 messages=messages,
                 temperature=settings.temperature,
                 max_tokens=settings.max_tokens
@@ -238,7 +293,7 @@ async def chat_stream(request: ChatRequest):
 async def clear_documents():
     """Clear all documents from the knowledge base"""
     try:
-        weaviate_client.delete_all_documents()
+        _weaviate_client().delete_all_documents()
         return {"message": "All documents cleared successfully"}
     except Exception as e:
         logger.error(f"Failed to clear documents: {e}")
@@ -249,7 +304,7 @@ async def clear_documents():
 async def get_document_count():
     """Get the number of documents in the knowledge base"""
     try:
-        count = weaviate_client.get_document_count()
+        count = _weaviate_client().get_document_count()
         return {"count": count}
     except Exception as e:
         logger.error(f"Failed to get document count: {e}")
@@ -268,14 +323,14 @@ async def test_azure_openai(request: dict):
             {"role": "user", "content": test_message}
         ]
         
-        response = azure_openai_client.chat_completion(
+        response = _azure_openai_client().chat_completion(
             messages=messages,
             temperature=0.1,
             max_tokens=100
         )
         
         # Test embedding creation
-        test_embedding = azure_openai_client.create_embeddings([test_message])
+        test_embedding = _azure_openai_client().create_embeddings([test_message])
         
         return {
             "status": "success",
@@ -1,9 +1,11 @@
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
 
 class DocumentMetadata(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     filename: str
     file_type: str
     upload_date: datetime
@@ -12,30 +14,39 @@ class DocumentMetadata(BaseModel):
 
 
 class ChatMessage(BaseModel):
+    # Clients may still send a timestamp; it is ignored rather than parsed
+    model_config = ConfigDict(extra="ignore")
+
     role: str = Field(..., description="Role of the message sender (user or assistant)")
     content: str = Field(..., description="Content of the message")
-    timestamp: Optional[datetime] = None
 
 
 class ChatRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     message: str = Field(..., description="User's chat message")
-    conversation_history: Optional[List[ChatMessage]] = []
+    conversation_history: Optional[List[ChatMessage]] = Field(default_factory=list)
     stream: bool = Field(default=True, description="Whether to stream the response")
 
 
 class ChatResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     response: str = Field(..., description="AI response")
-    sources: Optional[List[str]] = Field(default=[], description="Source documents used")
-    conversation_id: Optional[str] = None
+    sources: Optional[List[str]] = Field(default_factory=list, description="Source documents used")
 
 
 class IngestRequest(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
     text_content: Optional[str] = None
     filename: Optional[str] = None
-    metadata: Optional[Dict[str, Any]] = {}
+    metadata: Optional[Dict[str, Any]] = Field(default_factory=dict)
 
 
 class IngestResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     success: bool
     message: str
     document_id: Optional[str] = None
@@ -43,11 +54,15 @@ class IngestResponse(BaseModel):
 
 
 class RetrievalResult(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     content: str
     metadata: Dict[str, Any]
     score: float
 
 
 class ErrorResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     error: str
     detail: Optional[str] = None 
\ No newline at end of file
@@ -8,16 +8,34 @@ import argparse
 import sys
 import os
 import asyncio
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
 # Add the backend directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from services.document_service import document_service
-from services.weaviate_client import weaviate_client
 from app.config import settings
 
 
+# Service modules connect on import, so load them on first use: worker processes spawned
+# for text splitting re-import this module as __mp_main__
+@lru_cache(maxsize=1)
+def _document_service():
+    from services.document_service import document_service
+    return document_service
+
+
+@lru_cache(maxsize=1)
+def _weaviate_client():
+    from services.weaviate_client import weaviate_client
+    return weaviate_client
+
+
 def ingest_file(file_path: str, file_type: str = None):
     """Ingest a single file"""
     try:
@@ -30,23 +48,50 @@ def ingest_file(file_path: str, file_type: str = None):
         if file_type is None:
             file_type = os.path.splitext(file_path)[1]
         
-        result = document_service.ingest_document(file_path)
-        
-        if result["success"]:
-            print(f"✅ Successfully ingested: {result['filename']}")
-            print(f"   Created {result['chunks_created']} chunks")
-            print(f"   File size: {result['file_size']} bytes")
-            return True
-        else:
-            print(f"❌ Failed to ingest: {result['message']}")
-            return False
+        result = _document_service().ingest_document(file_path)
+        return report_file_result(result)
             
     except Exception as e:
         print(f"❌ Error ingesting file: {e}")
         return False
 
 
-def ingest_directory(directory_path: str, recursive: bool = False):
+async def aingest_file(file_path: str, semaphore: asyncio.Semaphore):
+    """Ingest a single file on the event loop, limited by the shared semaphore"""
+    try:
+        async with semaphore:
+            print(f"Ingesting file: {file_path}")
+            result = await _document_service().aingest_document(file_path)
+        return report_file_result(result)
+        
+    except Exception as e:
+        print(f"❌ Error ingesting file: {e}")
+        return False
+
+
+def report_file_result(result: dict) -> bool:
+    """Print the outcome of a file ingest"""
+    if result["success"]:
+        # Print the report in one call so concurrent ingests don't interleave lines
+        print(
+            f"✅ Successfully ingested: {result['filename']}\n"
+            f"   Created {result['chunks_created']} chunks\n"
+            f"   File size: {result['file_size']} bytes"
+        )
+        return True
+    else:
+        print(f"❌ Failed to ingest: {result['message']}")
+        return False
+
+
+async def ingest_files(file_paths: list, workers: int) -> int:
+    """Ingest files concurrently, returning the number that succeeded"""
+    semaphore = asyncio.Semaphore(workers)
+    results = await asyncio.gather(*(aingest_file(path, semaphore) for path in file_paths))
+    return sum(results)
+
+
+def ingest_directory(directory_path: str, recursive: bool = False, workers: int = 8):
     """Ingest all supported files in a directory"""
     try:
         directory = Path(directory_path)
@@ -54,12 +99,12 @@ def ingest_directory(directory_path: str, recursive: bool = False):
             print(f"Error: Directory '{directory_path}' does not exist")
             return False
         
-        pattern = "**/*" if recursive else "*"
         supported_extensions = settings.allowed_file_types
+        suffixes = {ext.lower() for ext in supported_extensions}
         
-        files_to_ingest = []
-        for ext in supported_extensions:
-            files_to_ingest.extend(directory.glob(f"{pattern}{ext}"))
+        # Scan the directory once and filter by extension
+        candidates = directory.rglob("*") if recursive else directory.glob("*")
+        files_to_ingest = [path for path in candidates if path.suffix.lower() in suffixes and path.is_file()]
         
         if not files_to_ingest:
             print(f"No supported files found in {directory_path}")
@@ -68,10 +113,13 @@ def ingest_directory(directory_path: str, recursive: bool = False):
         
         print(f"Found {len(files_to_ingest)} files to ingest")
         
-        success_count = 0
-        for file_path in files_to_ingest:
-            if ingest_file(str(file_path)):
-                success_count += 1
+        # Ingestion is dominated by embedding and Weaviate round-trips, so run files concurrently
+        # on one event loop (uvloop where available)
+        file_paths = [str(path) for path in files_to_ingest]
+        if uvloop is not None:
+            success_count = uvloop.run(ingest_files(file_paths, workers))
+        else:
+            success_count = asyncio.run(ingest_files(file_paths, workers))
         
         print(f"\n📊 Summary: {success_count}/{len(files_to_ingest)} files ingested successfully")
         return success_count > 0
@@ -86,7 +134,7 @@ def ingest_text(text_content: str, filename: str = "manual_input"):
     try:
         print(f"Ingesting text content as: {filename}")
         
-        result = document_service.ingest_text_content(text_content, filename)
+        result = _document_service().ingest_text_content(text_content, filename)
         
         if result["success"]:
             print(f"✅ Successfully ingested text: {result['filename']}")
@@ -105,7 +153,7 @@ def clear_knowledge_base():
     """Clear all documents from the knowledge base"""
     try:
         print("Clearing all documents from knowledge base...")
-        weaviate_client.delete_all_documents()
+        _weaviate_client().delete_all_documents()
         print("✅ Knowledge base cleared successfully")
         return True
     except Exception as e:
@@ -116,7 +164,7 @@ def clear_knowledge_base():
 def show_stats():
     """Show knowledge base statistics"""
     try:
-        count = weaviate_client.get_document_count()
+        count = _weaviate_client().get_document_count()
         print(f"📊 Knowledge Base Statistics:")
         print(f"   Total document chunks: {count}")
         return True
@@ -132,6 +180,7 @@ def main():
     parser.add_argument("--filename", help="Filename for text content (when using --text)")
     parser.add_argument("--directory", action="store_true", help="Treat path as directory")
     parser.add_argument("--recursive", action="store_true", help="Recursively ingest directory")
+    parser.add_argument("--workers", type=int, default=8, help="Number of files to ingest in parallel")
     parser.add_argument("--clear", action="store_true", help="Clear all documents from knowledge base")
     parser.add_argument("--stats", action="store_true", help="Show knowledge base statistics")
     parser.add_argument("--file-type", help="Override file type detection")
@@ -156,7 +205,7 @@ def main():
         return
     
     if args.directory or os.path.isdir(args.path):
-        ingest_directory(args.path, args.recursive)
+        ingest_directory(args.path, args.recursive, args.workers)
     else:
         ingest_file(args.path, args.file_type)
     
@@ -1,29 +1,100 @@
 import logging
-from typing import List, Dict, Any, AsyncGenerator
-from openai import AzureOpenAI
+from typing import List, Dict, Any, AsyncGenerator, Tuple
+from openai import AzureOpenAI, AsyncAzureOpenAI
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+RAG_SYSTEM_PROMPT = """You are a helpful AI assistant that answers questions based on the provided context. 
+        Use the context documents to answer the user's question. If the answer cannot be found in the context, 
+        say so clearly. Always cite the source documents when possible."""
+
+
+# Seconds to wait for a warmup request; it only opens a connection, so don't hold up ingest for it
+WARMUP_TIMEOUT = 5.0
+
 
 class AzureOpenAIClient:
     def __init__(self):
-        self.client = AzureOpenAI(
-            api_key=settings.azure_openai_api_key,
-            api_version=settings.azure_openai_api_version,
-            azure_endpoint=settings.azure_openai_endpoint
-        )
+        self._client = None
+        self._async_client = None
+        # Held so the background warmup task isn't garbage collected mid-request
+        self._warmup_task = None
+
+    @property
+    def client(self) -> AzureOpenAI:
+        """Azure OpenAI client, created on first use"""
+        if self._client is None:
+            self._client = AzureOpenAI(
+                api_key=settings.azure_openai_api_key,
+                api_version=settings.azure_openai_api_version,
+                azure_endpoint=settings.azure_openai_endpoint
+            )
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncAzureOpenAI:
+        """Async Azure OpenAI client, created on first use"""
+        if self._async_client is None:
+            self._async_client = AsyncAzureOpenAI(
+                api_key=settings.azure_openai_api_key,
+                api_version=settings.azure_openai_api_version,
+                azure_endpoint=settings.azure_openai_endpoint
+            )
+        return self._async_client
+
+    def start_warmup(self) -> None:
+        """Open a pooled connection in the background if the client hasn't been used yet"""
+        if self._client is not None:
+            return
+        # Create the client here so the warmup can't race the first real request to create it
+        client = self.client.with_options(timeout=WARMUP_TIMEOUT, max_retries=0)
+        executor = ThreadPoolExecutor(max_workers=1)
+        executor.submit(self._warmup, client)
+        executor.shutdown(wait=False)
+
+    def start_awarmup(self) -> None:
+        """Open a pooled connection for the async client in the background if it hasn't been used yet"""
+        if self._async_client is not None:
+            return
+        client = self.async_client.with_options(timeout=WARMUP_TIMEOUT, max_retries=0)
+        self._warmup_task = asyncio.create_task(self._awarmup(client))
+
+    @staticmethod
+    def _warmup(client: AzureOpenAI) -> None:
+        """Send a cheap request to complete the TLS handshake; the connection stays in the client's pool"""
+        try:
+            client.models.list()
+        except Exception as e:
+            logger.debug(f"Azure OpenAI warmup failed: {e}")
+
+    @staticmethod
+    async def _awarmup(client: AsyncAzureOpenAI) -> None:
+        """Async counterpart of _warmup"""
+        try:
+            await client.models.list()
+        except Exception as e:
+            logger.debug(f"Azure OpenAI warmup failed: {e}")
+
+    @staticmethod
+    def _batches(texts: List[str]) -> List[List[str]]:
+        """Split texts into request-sized batches"""
+        size = settings.embedding_batch_size
+        return [texts[i:i + size] for i in range(0, len(texts), size)]
 
     def create_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Create embeddings for a list of texts"""
+        """Create embeddings for a list of texts, one request per batch"""
         try:
-            response = self.client.embeddings.create(
-                model=settings.azure_openai_embedding_deployment,
-                input=texts
-            )
+            embeddings = []
+            for batch in self._batches(texts):
+                response = self.client.embeddings.create(
+                    model=settings.azure_openai_embedding_deployment,
+                    input=batch
+                )
+                embeddings.extend(item.embedding for item in response.data)
             
-            embeddings = [item.embedding for item in response.data]
             logger.info(f"Created {len(embeddings)} embeddings")
             return embeddings
             
@@ -31,9 +102,43 @@ class AzureOpenAIClient:
             logger.error(f"Failed to create embeddings: {e}")
             raise
 
+    async def aiter_embedding_batches(
+        self, 
+        texts: List[str]
+    ) -> AsyncGenerator[Tuple[int, List[List[float]]], None]:
+        """Embed texts in concurrent batches, yielding (start index, embeddings) as each batch completes"""
+        semaphore = asyncio.Semaphore(settings.embedding_concurrency)
+        size = settings.embedding_batch_size
+
+        async def embed_batch(start: int) -> Tuple[int, List[List[float]]]:
+            async with semaphore:
+                response = await self.async_client.embeddings.create(
+                    model=settings.azure_openai_embedding_deployment,
+                    input=texts[start:start + size]
+                )
+            return start, [item.embedding for item in response.data]
+
+        tasks = [asyncio.create_task(embed_batch(start)) for start in range(0, len(texts), size)]
+        try:
+            for next_batch in asyncio.as_completed(tasks):
+                yield await next_batch
+        finally:
+            # Don't leave requests running if the caller stops early or a batch fails
+            for task in tasks:
+                task.cancel()
+
     def create_embedding(self, text: str) -> List[float]:
         """Create embedding for a single text"""
-        return self.create_embeddings([text])[0]
+        try:
+            response = self.client.embeddings.create(
+                model=settings.azure_openai_embedding_deployment,
+                input=text
+            )
+            return response.data[0].embedding
+            
+        except Exception as e:
+            logger.error(f"Failed to create embedding: {e}")
+            raise
 
     async def chat_completion_stream(
         self, 
@@ -46,7 +151,7 @@ class AzureOpenAIClient:
             logger.info("Starting streaming chat completion")
             
             # Create the streaming response
-            response = self.client.chat.completions.create(
+            response = await self.async_client.chat.completions.create(
                 model=settings.azure_openai_deployment_name,
                 messages=messages,
                 temperature=temperature,
@@ -56,16 +161,14 @@ class AzureOpenAIClient:
             
             chunk_count = 0
             # Process each chunk immediately as it arrives
-            for chunk in response:
+            async for chunk in response:
                 if chunk.choices and len(chunk.choices) > 0:
                     if chunk.choices[0].delta.content is not None:
                         content = chunk.choices[0].delta.content
                         chunk_count += 1
-                        logger.debug(f"Streaming chunk #{chunk_count}: '{content}'")
+                        if logger.isEnabledFor(logging.DEBUG):
+                            logger.debug(f"Streaming chunk #{chunk_count}: '{content}'")
                         yield content
-                        
-                        # Yield control back to the event loop to ensure real streaming
-                        await asyncio.sleep(0)
                     
             logger.info(f"Streaming completed with {chunk_count} chunks")
                     
@@ -99,28 +202,29 @@ class AzureOpenAIClient:
             logger.error(f"Failed to create chat completion: {e}")
             raise
 
-    def create_rag_prompt(self, query: str, context_docs: List[Dict[str, Any]]) -> List[Dict[str, str]]:
-        """Create RAG prompt with context documents"""
-        context_text = "\n\n".join([
-            f"Document: {doc['metadata']['filename']}\nContent: {doc['content']}"
-            for doc in context_docs
-        ])
-        
-        system_prompt = """You are a helpful AI assistant that answers questions based on the provided context. 
-        Use the context documents to answer the user's question. If the answer cannot be found in the context, 
-        say so clearly. Always cite the source documents when possible."""
-        
-        user_prompt = f"""Context Documents:
-{context_text}
-
-User Question: {query}
-
-Please provide a helpful answer based on the context above."""
+    def create_rag_prompt(
+        self, 
+        query: str, 
+        context_docs: List[Dict[str, Any]]
+    ) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Create RAG prompt with context documents as (system message, user message)"""
+        parts = ["Context Documents:\n"]
+        append = parts.append
+        for i, doc in enumerate(context_docs):
+            if i:
+                append("\n\n")
+            append("Document: ")
+            append(doc["metadata"]["filename"])
+            append("\nContent: ")
+            append(doc["content"])
+        append("\n\nUser Question: ")
+        append(query)
+        append("\n\nPlease provide a helpful answer based on the context above.")
 
-        return [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
+        return (
+            {"role": "system", "content": RAG_SYSTEM_PROMPT},
+            {"role": "user", "content": "".join(parts)}
+        )
 
 
 # Global instance
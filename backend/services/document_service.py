@@ -1,78 +1,328 @@
+import asyncio
+import hashlib
+import io
 import logging
 import os
-from typing import List, Dict, Any
-from datetime import datetime
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    UnstructuredMarkdownLoader
-)
+import time
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import aclosing
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timezone
+from pathlib import Path
+from langchain_community.document_loaders import PyPDFLoader
 from langchain.schema import Document
+from pypdf import PdfReader
+import docx
+import numpy as np
 
 from app.config import settings
 from services.azure_openai_client import azure_openai_client
 from services.weaviate_client import weaviate_client
+from utils.text_splitting import build_text_splitter, get_split_executor, split_documents_parallel
 
 logger = logging.getLogger(__name__)
 
+# Documents with at least this many pages are split across CPU cores
+PARALLEL_SPLIT_MIN_DOCUMENTS = 16
+
+# Files up to this size are read into memory in one go; larger ones are parsed from disk
+MAX_IN_MEMORY_FILE_SIZE = 200 * 1024 * 1024
+
+# Plain-text formats, split straight from the decoded string
+TEXT_FILE_TYPES = ('.md', '.txt', '.text')
+
+# Read size when hashing files too large to hold in memory
+HASH_READ_SIZE = 1024 * 1024
+
+
+@lru_cache(maxsize=settings.query_embedding_cache_size)
+def _cached_query_embedding(normalized_query: str) -> np.ndarray:
+    """Embed a normalized query, memoized since the embedding doesn't depend on stored data"""
+    # float32 arrays take ~6KB per entry versus ~49KB for a tuple of Python floats;
+    # read-only since the same array is handed to every caller
+    embedding = np.asarray(azure_openai_client.create_embedding(normalized_query), dtype=np.float32)
+    embedding.flags.writeable = False
+    return embedding
+
+
+def _sha256_hex(data: bytes) -> str:
+    """Hex SHA-256 of file contents, stored with each chunk to detect re-ingests"""
+    return hashlib.sha256(data).hexdigest()
+
 
 class DocumentService:
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap,
-            length_function=len,
-        )
+        # Building the splitter here also loads the tiktoken encoding once at import
+        self.text_splitter = build_text_splitter()
+        # Cache search results keyed by (normalized query, limit, Weaviate data version, TTL bucket)
+        self._search_cached = lru_cache(maxsize=settings.retrieval_cache_size)(self._search)
 
-    def load_document(self, file_path: str, file_type: str) -> List[Document]:
-        """Load document using appropriate LangChain loader"""
+    def load_document(self, file_path: str, file_type: str, file_size: int = None) -> List[Document]:
+        """Load a document from disk using the appropriate loader for its type"""
         try:
             if file_type.lower() == '.pdf':
-                loader = PyPDFLoader(file_path)
-            elif file_type.lower() == '.md':
-                loader = UnstructuredMarkdownLoader(file_path)
-            elif file_type.lower() in ['.txt', '.text']:
-                loader = TextLoader(file_path, encoding='utf-8')
+                if file_size is None:
+                    file_size = os.stat(file_path).st_size
+                if file_size <= MAX_IN_MEMORY_FILE_SIZE:
+                    # One sequential read instead of pypdf's many small seeks and reads on the file
+                    with open(file_path, 'rb') as f:
+                        return self.load_bytes(f.read(), file_path, file_type)
+                documents = PyPDFLoader(file_path).load()
+            elif file_type.lower() in TEXT_FILE_TYPES:
+                # Plain text needs no loader: read the file straight into a single Document
+                documents = [Document(
+                    page_content=Path(file_path).read_text(encoding='utf-8', errors='replace'),
+                    metadata={"source": file_path}
+                )]
+            elif file_type.lower() == '.docx':
+                with open(file_path, 'rb') as f:
+                    return self.load_bytes(f.read(), file_path, file_type)
+            else:
+                raise ValueError(f"Unsupported file type: {file_type}")
+            
+            logger.info("Loaded %d document pages from %s", len(documents), file_path)
+            return documents
+            
+        except Exception as e:
+            logger.error("Failed to load document %s: %s", file_path, e)
+            raise
+
+    def load_bytes(self, data: bytes, filename: str, file_type: str) -> List[Document]:
+        """Load an in-memory document without writing it to disk"""
+        try:
+            file_type = file_type.lower()
+            if file_type == '.pdf':
+                reader = PdfReader(io.BytesIO(data))
+                documents = [
+                    Document(page_content=page.extract_text(), metadata={"source": filename, "page": i})
+                    for i, page in enumerate(reader.pages)
+                ]
+            elif file_type in TEXT_FILE_TYPES:
+                documents = [Document(page_content=data.decode('utf-8', errors='replace'), metadata={"source": filename})]
+            elif file_type == '.docx':
+                paragraphs = docx.Document(io.BytesIO(data)).paragraphs
+                documents = [Document(
+                    page_content="\n".join(paragraph.text for paragraph in paragraphs),
+                    metadata={"source": filename}
+                )]
             else:
                 raise ValueError(f"Unsupported file type: {file_type}")
             
-            documents = loader.load()
-            logger.info(f"Loaded {len(documents)} document pages from {file_path}")
+            logger.info("Loaded %d document pages from %s", len(documents), filename)
             return documents
             
         except Exception as e:
-            logger.error(f"Failed to load document {file_path}: {e}")
+            logger.error("Failed to load document %s: %s", filename, e)
             raise
 
     def split_documents(self, documents: List[Document]) -> List[Document]:
         """Split documents into chunks"""
         try:
-            chunks = self.text_splitter.split_documents(documents)
-            logger.info(f"Split documents into {len(chunks)} chunks")
+            if len(documents) >= PARALLEL_SPLIT_MIN_DOCUMENTS:
+                # Splitting is CPU-bound pure Python, so use processes rather than threads
+                try:
+                    chunks = split_documents_parallel(documents)
+                except BrokenProcessPool as e:
+                    # A worker died; start a fresh pool next time and split this call in-process
+                    logger.warning("Split worker pool broke, splitting in-process: %s", e)
+                    get_split_executor().shutdown(wait=False)
+                    get_split_executor.cache_clear()
+                    chunks = self.text_splitter.split_documents(documents)
+            else:
+                chunks = self.text_splitter.split_documents(documents)
+            logger.info("Split documents into %d chunks", len(chunks))
             return chunks
         except Exception as e:
-            logger.error(f"Failed to split documents: {e}")
+            logger.error("Failed to split documents: %s", e)
             raise
 
     def process_text_content(self, text_content: str, filename: str = "text_input") -> List[Document]:
         """Process raw text content into document chunks"""
         try:
-            # Create a document from text content
-            document = Document(
-                page_content=text_content,
-                metadata={"source": filename}
-            )
-            
-            # Split into chunks
-            chunks = self.text_splitter.split_documents([document])
-            logger.info(f"Processed text content into {len(chunks)} chunks")
+            # Split the raw string and only wrap the resulting chunks in Documents
+            chunks = [
+                Document(page_content=chunk, metadata={"source": filename})
+                for chunk in self.text_splitter.split_text(text_content)
+            ]
+            logger.info("Processed text content into %d chunks", len(chunks))
             return chunks
             
         except Exception as e:
-            logger.error(f"Failed to process text content: {e}")
+            logger.error("Failed to process text content: %s", e)
+            raise
+
+    def load_and_split_bytes(self, data: bytes, filename: str, file_type: str) -> List[Document]:
+        """Load an in-memory document and split it into chunks"""
+        if file_type.lower() in TEXT_FILE_TYPES:
+            # No page Documents needed for plain text: split the decoded string directly
+            return self.process_text_content(data.decode('utf-8', errors='replace'), filename)
+        return self.split_documents(self.load_bytes(data, filename, file_type))
+
+    def _build_weaviate_docs(self, chunks: List[Document], filename: str, file_type: str, file_hash: str = None) -> List[Dict[str, Any]]:
+        """Prepare document objects for Weaviate"""
+        shared = {
+            "filename": filename,
+            "file_type": file_type,
+            "upload_date": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')  # RFC3339 format
+        }
+        if file_hash:
+            shared["file_hash"] = file_hash
+        return [
+            {"content": chunk.page_content, "chunk_index": i, **shared}
+            for i, chunk in enumerate(chunks)
+        ]
+
+    @staticmethod
+    def _plan_embedding_inputs(texts: List[str]) -> Tuple[List[str], List[int]]:
+        """Dedupe and order texts for embedding, returning (texts to embed, embedding index for each input text)"""
+        # Repeated chunks (headers, footers, disclaimers) are embedded once; sorting by length
+        # keeps similarly sized texts in the same request batch
+        inputs = sorted(dict.fromkeys(texts), key=len)
+        index_by_text = {text: j for j, text in enumerate(inputs)}
+        
+        if len(inputs) < len(texts):
+            logger.info("Embedding %d unique of %d chunks", len(inputs), len(texts))
+        return inputs, [index_by_text[text] for text in texts]
+
+    def _store_chunks(self, chunks: List[Document], filename: str, file_type: str, file_hash: str = None) -> List[str]:
+        """Embed document chunks and store them in Weaviate"""
+        try:
+            # Create embeddings as one float32 matrix, then gather its rows back into chunk order
+            inputs, positions = self._plan_embedding_inputs([chunk.page_content for chunk in chunks])
+            input_embeddings = np.asarray(azure_openai_client.create_embeddings(inputs), dtype=np.float32)
+            embeddings = input_embeddings[positions]
+            
+            # Store in Weaviate
+            weaviate_docs = self._build_weaviate_docs(chunks, filename, file_type, file_hash)
+            return weaviate_client.add_documents(weaviate_docs, embeddings)
+        except Exception:
+            self._discard_partial_ingest(file_hash)
             raise
 
+    async def _astore_chunks(self, chunks: List[Document], filename: str, file_type: str, file_hash: str = None) -> List[str]:
+        """Embed document chunks and store each embedded batch in Weaviate as soon as it arrives"""
+        try:
+            return await self._apipeline_chunks(chunks, filename, file_type, file_hash)
+        except Exception:
+            await asyncio.to_thread(self._discard_partial_ingest, file_hash)
+            raise
+
+    async def _apipeline_chunks(self, chunks: List[Document], filename: str, file_type: str, file_hash: str) -> List[str]:
+        """Run the embed/store pipeline for _astore_chunks"""
+        inputs, positions = self._plan_embedding_inputs([chunk.page_content for chunk in chunks])
+        weaviate_docs = self._build_weaviate_docs(chunks, filename, file_type, file_hash)
+        
+        # Chunk indices that use each input's embedding
+        chunks_by_input = [[] for _ in inputs]
+        for i, j in enumerate(positions):
+            chunks_by_input[j].append(i)
+        
+        # Overlap embedding requests with Weaviate writes: the producer queues embedded batches
+        # while the consumer stores the previous ones
+        queue = asyncio.Queue(maxsize=4)
+        document_ids = [None] * len(chunks)
+
+        async def produce():
+            try:
+                # Close the generator on exit so it cancels embedding requests still in flight
+                async with aclosing(azure_openai_client.aiter_embedding_batches(inputs)) as batches:
+                    async for start, batch_embeddings in batches:
+                        await queue.put((start, batch_embeddings))
+            except asyncio.CancelledError:
+                # Only cancelled once the consumer has stopped, so nothing is waiting for the end marker
+                raise
+            except Exception:
+                await queue.put(None)
+                raise
+            await queue.put(None)
+
+        async def consume():
+            while (item := await queue.get()) is not None:
+                start, batch_embeddings = item
+                indices, rows = [], []
+                for offset in range(len(batch_embeddings)):
+                    for i in chunks_by_input[start + offset]:
+                        indices.append(i)
+                        rows.append(offset)
+                vectors = np.asarray(batch_embeddings, dtype=np.float32)[rows]
+                
+                batch_ids = await asyncio.to_thread(
+                    weaviate_client.add_documents, [weaviate_docs[i] for i in indices], vectors
+                )
+                for i, document_id in zip(indices, batch_ids):
+                    document_ids[i] = document_id
+
+        producer = asyncio.create_task(produce())
+        try:
+            await consume()
+        except BaseException:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+            raise
+        # Re-raises any embedding failure that ended the stream early
+        await producer
+        
+        return document_ids
+
+    @staticmethod
+    def _discard_partial_ingest(file_hash: str):
+        """Delete chunks written by a failed ingest so the file isn't later skipped as already ingested"""
+        if not file_hash:
+            return
+        try:
+            weaviate_client.delete_documents_by_file_hash(file_hash)
+        except Exception as e:
+            logger.error("Failed to remove partially ingested chunks for file hash %s: %s", file_hash, e)
+
+    @staticmethod
+    def _ingest_success(message: str, filename: str, chunks: List[Document], document_ids: List[str], **extra) -> Dict[str, Any]:
+        """Build the result of a successful ingest"""
+        return {
+            "success": True,
+            "message": message,
+            "filename": filename,
+            "chunks_created": len(chunks),
+            **extra,
+            "document_ids": document_ids
+        }
+
+    @staticmethod
+    def _ingest_failure(message: str, filename: str) -> Dict[str, Any]:
+        """Build the result of a failed ingest"""
+        return {
+            "success": False,
+            "message": message,
+            "filename": filename,
+            "chunks_created": 0
+        }
+
+    @staticmethod
+    def _read_and_hash(file_path: str, file_size: int) -> Tuple[Optional[bytes], str]:
+        """Hash a file, returning its contents too when small enough to load from memory"""
+        if file_size <= MAX_IN_MEMORY_FILE_SIZE:
+            # Read once and reuse the buffer for both hashing and loading
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            return data, _sha256_hex(data)
+        
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            while block := f.read(HASH_READ_SIZE):
+                digest.update(block)
+        return None, digest.hexdigest()
+
+    def _already_ingested(self, file_hash: str, filename: str, file_size: int) -> Optional[Dict[str, Any]]:
+        """Result for a file whose contents are already stored, or None if they aren't"""
+        document_ids = weaviate_client.find_document_ids_by_file_hash(file_hash)
+        if not document_ids:
+            return None
+        
+        logger.info("Skipping %s: identical file already ingested", filename)
+        return self._ingest_success(
+            f"{filename} is already ingested", filename, [], document_ids, file_size=file_size
+        )
+
     def ingest_document(self, file_path: str, filename: str = None) -> Dict[str, Any]:
         """Ingest a document file into the vector database"""
         try:
@@ -80,52 +330,96 @@ class DocumentService:
                 filename = os.path.basename(file_path)
             
             file_type = os.path.splitext(filename)[1]
-            file_size = os.path.getsize(file_path)
+            # Stat once and reuse the size for loading and the result
+            file_size = os.stat(file_path).st_size
             
-            # Load and split document
-            documents = self.load_document(file_path, file_type)
-            chunks = self.split_documents(documents)
+            # Skip loading, splitting and embedding entirely if these bytes were ingested before
+            data, file_hash = self._read_and_hash(file_path, file_size)
+            existing = self._already_ingested(file_hash, filename, file_size)
+            if existing:
+                return existing
             
-            # Prepare documents for vector storage
-            chunk_texts = [chunk.page_content for chunk in chunks]
+            # Load and split document while the embedding connection warms up
+            azure_openai_client.start_warmup()
+            if data is not None:
+                chunks = self.load_and_split_bytes(data, file_path, file_type)
+            else:
+                chunks = self.split_documents(self.load_document(file_path, file_type, file_size))
             
-            # Create embeddings
-            embeddings = azure_openai_client.create_embeddings(chunk_texts)
+            # Embed and store chunks
+            document_ids = self._store_chunks(chunks, filename, file_type, file_hash)
             
-            # Prepare document objects for Weaviate
-            weaviate_docs = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                weaviate_docs.append({
-                    "content": chunk.page_content,
-                    "filename": filename,
-                    "chunk_index": i,
-                    "file_type": file_type,
-                    "upload_date": datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')  # RFC3339 format
-                })
+            logger.info("Successfully ingested document: %s", filename)
+            return self._ingest_success(
+                f"Successfully ingested {filename}", filename, chunks, document_ids, file_size=file_size
+            )
             
-            # Store in Weaviate
-            document_ids = weaviate_client.add_documents(weaviate_docs, embeddings)
+        except Exception as e:
+            logger.error("Failed to ingest document %s: %s", filename, e)
+            return self._ingest_failure(f"Failed to ingest document: {str(e)}", filename)
+
+    async def aingest_document(self, file_path: str, filename: str = None) -> Dict[str, Any]:
+        """Ingest a document file into the vector database, embedding chunks concurrently"""
+        try:
+            if not filename:
+                filename = os.path.basename(file_path)
+            
+            file_type = os.path.splitext(filename)[1]
+            # Stat once and reuse the size for loading and the result
+            file_size = os.stat(file_path).st_size
+            
+            # Skip loading, splitting and embedding entirely if these bytes were ingested before
+            data, file_hash = await asyncio.to_thread(self._read_and_hash, file_path, file_size)
+            existing = await asyncio.to_thread(self._already_ingested, file_hash, filename, file_size)
+            if existing:
+                return existing
+            
+            # Load and split document off the event loop while the embedding connection warms up
+            azure_openai_client.start_awarmup()
+            if data is not None:
+                chunks = await asyncio.to_thread(self.load_and_split_bytes, data, file_path, file_type)
+            else:
+                documents = await asyncio.to_thread(self.load_document, file_path, file_type, file_size)
+                chunks = await asyncio.to_thread(self.split_documents, documents)
             
-            result = {
-                "success": True,
-                "message": f"Successfully ingested {filename}",
-                "filename": filename,
-                "chunks_created": len(chunks),
-                "file_size": file_size,
-                "document_ids": document_ids
-            }
+            # Embed and store chunks
+            document_ids = await self._astore_chunks(chunks, filename, file_type, file_hash)
             
-            logger.info(f"Successfully ingested document: {filename}")
-            return result
+            logger.info("Successfully ingested document: %s", filename)
+            return self._ingest_success(
+                f"Successfully ingested {filename}", filename, chunks, document_ids, file_size=file_size
+            )
             
         except Exception as e:
-            logger.error(f"Failed to ingest document {filename}: {e}")
-            return {
-                "success": False,
-                "message": f"Failed to ingest document: {str(e)}",
-                "filename": filename,
-                "chunks_created": 0
-            }
+            logger.error("Failed to ingest document %s: %s", filename, e)
+            return self._ingest_failure(f"Failed to ingest document: {str(e)}", filename)
+
+    async def aingest_bytes(self, data: bytes, filename: str) -> Dict[str, Any]:
+        """Ingest an in-memory file (e.g. an upload) into the vector database, embedding chunks concurrently"""
+        try:
+            file_type = os.path.splitext(filename)[1]
+            
+            # Skip loading, splitting and embedding entirely if these bytes were ingested before
+            file_hash = await asyncio.to_thread(_sha256_hex, data)
+            existing = await asyncio.to_thread(self._already_ingested, file_hash, filename, len(data))
+            if existing:
+                return existing
+            
+            # Load and split document off the event loop while the embedding connection warms up
+            azure_openai_client.start_awarmup()
+            chunks = await asyncio.to_thread(self.load_and_split_bytes, data, filename, file_type)
+            
+            # Embed and store chunks
+            document_ids = await self._astore_chunks(chunks, filename, file_type, file_hash)
+            
+            logger.info("Successfully ingested document: %s", filename)
+            return self._ingest_success(
+                f"Successfully ingested {filename}", filename, chunks, document_ids, file_size=len(data)
+            )
+            
+        except Exception as e:
+            logger.error("Failed to ingest document %s: %s", filename, e)
+            return self._ingest_failure(f"Failed to ingest document: {str(e)}", filename)
 
     def ingest_text_content(self, text_content: str, filename: str = "text_input") -> Dict[str, Any]:
         """Ingest raw text content into the vector database"""
@@ -133,45 +427,39 @@ class DocumentService:
             # Process text into chunks
             chunks = self.process_text_content(text_content, filename)
             
-            # Prepare documents for vector storage
-            chunk_texts = [chunk.page_content for chunk in chunks]
-            
-            # Create embeddings
-            embeddings = azure_openai_client.create_embeddings(chunk_texts)
+            # Embed and store chunks
+            document_ids = self._store_chunks(chunks, filename, ".txt")
             
-            # Prepare document objects for Weaviate
-            weaviate_docs = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                weaviate_docs.append({
-                    "content": chunk.page_content,
-                    "filename": filename,
-                    "chunk_index": i,
-                    "file_type": ".txt",
-                    "upload_date": datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ')  # RFC3339 format
-                })
+            logger.info("Successfully ingested text content: %s", filename)
+            return self._ingest_success("Successfully ingested text content", filename, chunks, document_ids)
             
-            # Store in Weaviate
-            document_ids = weaviate_client.add_documents(weaviate_docs, embeddings)
+        except Exception as e:
+            logger.error("Failed to ingest text content: %s", e)
+            return self._ingest_failure(f"Failed to ingest text content: {str(e)}", filename)
+
+    async def aingest_text_content(self, text_content: str, filename: str = "text_input") -> Dict[str, Any]:
+        """Ingest raw text content into the vector database, embedding chunks concurrently"""
+        try:
+            # Process text into chunks off the event loop
+            chunks = await asyncio.to_thread(self.process_text_content, text_content, filename)
             
-            result = {
-                "success": True,
-                "message": f"Successfully ingested text content",
-                "filename": filename,
-                "chunks_created": len(chunks),
-                "document_ids": document_ids
-            }
+            # Embed and store chunks
+            document_ids = await self._astore_chunks(chunks, filename, ".txt")
             
-            logger.info(f"Successfully ingested text content: {filename}")
-            return result
+            logger.info("Successfully ingested text content: %s", filename)
+            return self._ingest_success("Successfully ingested text content", filename, chunks, document_ids)
             
         except Exception as e:
-            logger.error(f"Failed to ingest text content: {e}")
-            return {
-                "success": False,
-                "message": f"Failed to ingest text content: {str(e)}",
-                "filename": filename,
-                "chunks_created": 0
-            }
+            logger.error("Failed to ingest text content: %s", e)
+            return self._ingest_failure(f"Failed to ingest text content: {str(e)}", filename)
+
+    def _search(self, query: str, limit: int, data_version: int, ttl_bucket: int) -> Tuple[Dict[str, Any], ...]:
+        """Embed a query and run the similarity search (data_version and ttl_bucket only key the cache)"""
+        # Create query embedding (cached across data versions)
+        query_embedding = _cached_query_embedding(query).tolist()
+        
+        # Perform similarity search
+        return tuple(weaviate_client.similarity_search(query_embedding, limit))
 
     def retrieve_relevant_documents(self, query: str, limit: int = None) -> List[Dict[str, Any]]:
         """Retrieve relevant documents for a query"""
@@ -179,17 +467,17 @@ class DocumentService:
             if limit is None:
                 limit = settings.max_retrieved_docs
             
-            # Create query embedding
-            query_embedding = azure_openai_client.create_embedding(query)
-            
-            # Perform similarity search
-            results = weaviate_client.similarity_search(query_embedding, limit)
+            # Repeated queries are served from cache until the next write through this process,
+            # or until the TTL bucket rolls over for writes made elsewhere (CLI, other workers)
+            normalized_query = " ".join(query.lower().split())
+            ttl_bucket = int(time.monotonic() // max(settings.retrieval_cache_ttl, 1))
+            results = list(self._search_cached(normalized_query, limit, weaviate_client.data_version, ttl_bucket))
             
-            logger.info(f"Retrieved {len(results)} relevant documents for query")
+            logger.info("Retrieved %d relevant documents for query", len(results))
             return results
             
         except Exception as e:
-            logger.error(f"Failed to retrieve relevant documents: {e}")
+            logger.error("Failed to retrieve relevant documents: %s", e)
             raise
 
 
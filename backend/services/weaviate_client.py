@@ -1,33 +1,56 @@
 import weaviate
 import logging
-from typing import List, Dict, Any, Optional
-from weaviate.classes.init import Auth
-from weaviate.classes.query import MetadataQuery
+import uuid
+from typing import List, Dict, Any, Optional, Sequence
+from urllib.parse import urlparse
+from weaviate.classes.init import Auth, AdditionalConfig, Timeout
+from weaviate.classes.query import MetadataQuery, Filter
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Namespace for deterministic chunk UUIDs
+DOCUMENT_UUID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "weaviate://Documents")
+
+# Properties returned by similarity_search; anything else stored on an object is not fetched
+SEARCH_RESULT_PROPERTIES = ("content", "filename", "chunk_index", "file_type", "upload_date")
+
+# Weaviate's default QUERY_MAXIMUM_RESULTS, the most chunks a file hash lookup can return
+MAX_FILE_HASH_MATCHES = 10_000
+
 
 class WeaviateClient:
     def __init__(self):
         self.client = None
         self.collection_name = "Documents"
+        # Property names defined by the collection schema
+        self._allowed_props = frozenset(SEARCH_RESULT_PROPERTIES + ("file_hash",))
+        # Bumped on every write so callers can invalidate cached search results
+        self.data_version = 0
         self._initialize_client()
 
     def _initialize_client(self):
         """Initialize Weaviate client"""
         try:
-            # Simple connection to localhost
-            self.client = weaviate.connect_to_local(
-                host="localhost",
-                port=8080,
-                skip_init_checks=True
+            # Connect over HTTP and gRPC (used by queries and the batch API) on the configured host
+            url = urlparse(settings.weaviate_url)
+            secure = url.scheme == "https"
+            self.client = weaviate.connect_to_custom(
+                http_host=url.hostname,
+                http_port=url.port or (443 if secure else 80),
+                http_secure=secure,
+                grpc_host=url.hostname,
+                grpc_port=settings.weaviate_grpc_port,
+                grpc_secure=secure,
+                additional_config=AdditionalConfig(timeout=Timeout(init=30, query=60, insert=120))
             )
+            if not self.client.is_ready():
+                raise RuntimeError(f"Weaviate at {settings.weaviate_url} is not ready")
             
             self._create_collection_if_not_exists()
             logger.info("Weaviate client initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize Weaviate client: {e}")
+            logger.error("Failed to initialize Weaviate client: %s", e)
             raise
 
     def _create_collection_if_not_exists(self):
@@ -56,38 +79,125 @@ class WeaviateClient:
                         weaviate.classes.config.Property(
                             name="upload_date",
                             data_type=weaviate.classes.config.DataType.DATE
-                        )
+                        ),
+                        self._file_hash_property()
                     ],
-                    vectorizer_config=weaviate.classes.config.Configure.Vectorizer.none()
+                    vectorizer_config=weaviate.classes.config.Configure.Vectorizer.none(),
+                    vector_index_config=self._vector_index_config()
                 )
-                logger.info(f"Created collection: {self.collection_name}")
+                logger.info("Created collection: %s", self.collection_name)
+            else:
+                # Collections created before file hashes were stored lack the property
+                collection = self.client.collections.get(self.collection_name)
+                if not any(prop.name == "file_hash" for prop in collection.config.get().properties):
+                    collection.config.add_property(self._file_hash_property())
+                    logger.info("Added file_hash property to collection: %s", self.collection_name)
         except Exception as e:
-            logger.error(f"Failed to create collection: {e}")
+            logger.error("Failed to create collection: %s", e)
             raise
 
-    def add_documents(self, documents: List[Dict[str, Any]], vectors: List[List[float]]) -> List[str]:
-        """Add documents with their embeddings to Weaviate"""
+    @staticmethod
+    def _file_hash_property():
+        """SHA-256 of the source file, used to skip re-ingesting identical files"""
+        return weaviate.classes.config.Property(
+            name="file_hash",
+            data_type=weaviate.classes.config.DataType.TEXT
+        )
+
+    def _vector_index_config(self):
+        """HNSW index config, compressing vectors with product quantization when enabled"""
+        if not settings.weaviate_pq_enabled:
+            return weaviate.classes.config.Configure.VectorIndex.hnsw()
+        return weaviate.classes.config.Configure.VectorIndex.hnsw(
+            quantizer=weaviate.classes.config.Configure.VectorIndex.Quantizer.pq(
+                segments=settings.weaviate_pq_segments,
+                centroids=256,
+                training_limit=settings.weaviate_pq_training_limit
+            )
+        )
+
+    def add_documents(self, documents: List[Dict[str, Any]], vectors: Sequence[Sequence[float]]) -> List[str]:
+        """Add documents with their embeddings (lists or float32 ndarray rows) to Weaviate using the batch API"""
         try:
             collection = self.client.collections.get(self.collection_name)
             
-            # Use individual insertions instead of batch to avoid GRPC
-            uuids = []
+            # Generate deterministic UUIDs client-side so they can be returned without reading back
+            # inserts, and re-ingesting the same chunk overwrites it instead of adding a duplicate
+            objects = []
             for doc, vector in zip(documents, vectors):
-                # Filter out any reserved fields if they exist
-                properties = {k: v for k, v in doc.items() if k not in ['id', 'vector']}
-                
-                # Insert each document individually using HTTP
-                uuid = collection.data.insert(
-                    properties=properties,
-                    vector=vector
+                # Pass schema-conforming documents through as-is; otherwise keep only schema properties
+                if doc.keys() <= self._allowed_props:
+                    properties = doc
+                else:
+                    properties = {k: v for k, v in doc.items() if k in self._allowed_props}
+                objects.append((properties, vector, self._document_uuid(properties)))
+            
+            failed_objects = self._batch_insert(collection, objects)
+            if failed_objects:
+                logger.warning("Retrying %d failed document inserts", len(failed_objects))
+                failed_objects = self._batch_insert(collection, [
+                    (failed.object_.properties, failed.object_.vector, failed.object_.uuid)
+                    for failed in failed_objects
+                ])
+            if failed_objects:
+                raise RuntimeError(
+                    f"Failed to insert {len(failed_objects)} documents: {failed_objects[0].message}"
                 )
-                uuids.append(str(uuid))
             
-            logger.info(f"Added {len(uuids)} documents to Weaviate")
+            uuids = [str(obj_uuid) for _, _, obj_uuid in objects]
+            self.data_version += 1
+            logger.info("Added %d documents to Weaviate", len(uuids))
             return uuids
             
         except Exception as e:
-            logger.error(f"Failed to add documents: {e}")
+            logger.error("Failed to add documents: %s", e)
+            raise
+
+    @staticmethod
+    def _document_uuid(properties: Dict[str, Any]) -> uuid.UUID:
+        """UUID derived from a chunk's source file hash (when known), filename, position and content"""
+        # uuid5 hashes the whole name, so the content needs no separate digest
+        name = f"{properties.get('filename')}|{properties.get('chunk_index')}|{properties.get('content')}"
+        # Chunks from different files never share an object, even when the filename and a chunk match
+        # (e.g. a new version of a document), so one file's ingest or cleanup can't touch another's
+        if properties.get("file_hash"):
+            name = f"{properties['file_hash']}|{name}"
+        return uuid.uuid5(DOCUMENT_UUID_NAMESPACE, name)
+
+    def _batch_insert(self, collection, objects: List[tuple]) -> list:
+        """Insert (properties, vector, uuid) tuples with the dynamic batcher, returning failed objects"""
+        with collection.batch.dynamic() as batch:
+            for properties, vector, obj_uuid in objects:
+                batch.add_object(properties=properties, vector=vector, uuid=obj_uuid)
+        return collection.batch.failed_objects
+
+    def find_document_ids_by_file_hash(self, file_hash: str) -> List[str]:
+        """Get the IDs of chunks stored from a file with this hash, in chunk order"""
+        try:
+            collection = self.client.collections.get(self.collection_name)
+            
+            response = collection.query.fetch_objects(
+                filters=Filter.by_property("file_hash").equal(file_hash),
+                limit=MAX_FILE_HASH_MATCHES,
+                return_properties=["chunk_index"]
+            )
+            
+            objects = sorted(response.objects, key=lambda item: item.properties.get("chunk_index", 0))
+            return [str(item.uuid) for item in objects]
+            
+        except Exception as e:
+            logger.error("Failed to look up file hash: %s", e)
+            raise
+
+    def delete_documents_by_file_hash(self, file_hash: str):
+        """Delete every chunk stored from a file with this hash"""
+        try:
+            collection = self.client.collections.get(self.collection_name)
+            collection.data.delete_many(where=Filter.by_property("file_hash").equal(file_hash))
+            self.data_version += 1
+            logger.info("Deleted documents with file hash %s", file_hash)
+        except Exception as e:
+            logger.error("Failed to delete documents by file hash: %s", e)
             raise
 
     def similarity_search(self, query_vector: List[float], limit: int = 5) -> List[Dict[str, Any]]:
@@ -98,38 +208,45 @@ class WeaviateClient:
             response = collection.query.near_vector(
                 near_vector=query_vector,
                 limit=limit,
+                return_properties=list(SEARCH_RESULT_PROPERTIES),
                 return_metadata=MetadataQuery(distance=True)
             )
             
-            results = []
-            for item in response.objects:
-                results.append({
-                    "content": item.properties.get("content", ""),
-                    "metadata": {
-                        "filename": item.properties.get("filename", ""),
-                        "chunk_index": item.properties.get("chunk_index", 0),
-                        "file_type": item.properties.get("file_type", ""),
-                        "upload_date": item.properties.get("upload_date", ""),
-                        "distance": item.metadata.distance if item.metadata else None
-                    },
-                    "score": 1 - (item.metadata.distance if item.metadata and item.metadata.distance else 0)
-                })
+            results = [self._to_search_result(item) for item in response.objects]
             
-            logger.info(f"Found {len(results)} similar documents")
+            logger.info("Found %d similar documents", len(results))
             return results
             
         except Exception as e:
-            logger.error(f"Failed to perform similarity search: {e}")
+            logger.error("Failed to perform similarity search: %s", e)
             raise
 
+    @staticmethod
+    def _to_search_result(item) -> Dict[str, Any]:
+        """Convert a Weaviate search hit into a result dict"""
+        properties = item.properties
+        distance = item.metadata.distance if item.metadata else None
+        return {
+            "content": properties.get("content", ""),
+            "metadata": {
+                "filename": properties.get("filename", ""),
+                "chunk_index": properties.get("chunk_index", 0),
+                "file_type": properties.get("file_type", ""),
+                "upload_date": properties.get("upload_date", ""),
+                "distance": distance
+            },
+            "score": 1 - (distance or 0)
+        }
+
     def delete_all_documents(self):
         """Delete all documents from the collection"""
         try:
             collection = self.client.collections.get(self.collection_name)
             collection.data.delete_many()
+            self.data_version += 1
             logger.info("Deleted all documents from collection")
         except Exception as e:
-            logger.error(f"Failed to delete documents: {e}")
+            logger.error("Failed to delete documents: %s", e)
             raise
 
     def get_document_count(self) -> int:
@@ -139,7 +256,7 @@ class WeaviateClient:
             response = collection.aggregate.over_all(total_count=True)
             return response.total_count
         except Exception as e:
-            logger.error(f"Failed to get document count: {e}")
+            logger.error("Failed to get document count: %s", e)
             return 0
 
     def close(self):
@@ -0,0 +1,95 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+# Run from the backend directory layout, like the scripts do
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test-key")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.openai.azure.com/")
+os.environ.setdefault("HEYGEN_API_KEY", "test-key")
+
+pytest.importorskip("weaviate")
+pytest.importorskip("langchain")
+pytest.importorskip("numpy")
+
+# The service modules connect on import, so hand them a mock Weaviate connection
+with mock.patch("weaviate.connect_to_custom", return_value=mock.MagicMock()):
+    from services.azure_openai_client import azure_openai_client
+    from services.document_service import document_service
+    from services.weaviate_client import weaviate_client
+
+
+@pytest.fixture
+def stored_objects(monkeypatch):
+    """In-memory stand-in for the Weaviate collection, keyed by object UUID"""
+    objects = {}
+
+    def batch_insert(collection, batch):
+        for properties, vector, obj_uuid in batch:
+            objects[str(obj_uuid)] = dict(properties)
+        return []
+
+    def find_document_ids_by_file_hash(file_hash):
+        matches = [(props["chunk_index"], obj_uuid) for obj_uuid, props in objects.items()
+                   if props.get("file_hash") == file_hash]
+        return [obj_uuid for _, obj_uuid in sorted(matches)]
+
+    def delete_documents_by_file_hash(file_hash):
+        for obj_uuid in [u for u, props in objects.items() if props.get("file_hash") == file_hash]:
+            del objects[obj_uuid]
+
+    monkeypatch.setattr(weaviate_client, "_batch_insert", batch_insert)
+    monkeypatch.setattr(weaviate_client, "find_document_ids_by_file_hash", find_document_ids_by_file_hash)
+    monkeypatch.setattr(weaviate_client, "delete_documents_by_file_hash", delete_documents_by_file_hash)
+    monkeypatch.setattr(azure_openai_client, "create_embeddings", lambda texts: [[0.0, 1.0]] * len(texts))
+    monkeypatch.setattr(azure_openai_client, "start_warmup", lambda: None)
+    return objects
+
+
+def _versions():
+    """Two versions of a document that differ only in their last chunk"""
+    paragraphs = [f"Paragraph {i}. " + "word " * 150 for i in range(6)]
+    v1 = "\n\n".join(paragraphs)
+    v2 = "\n\n".join(paragraphs[:-1] + ["A rewritten final paragraph."])
+    return v1, v2
+
+
+def test_reingesting_earlier_version_returns_all_its_chunks(stored_objects, tmp_path):
+    v1, v2 = _versions()
+    path = tmp_path / "doc.txt"
+
+    path.write_text(v1)
+    first = document_service.ingest_document(str(path))
+    path.write_text(v2)
+    second = document_service.ingest_document(str(path))
+    path.write_text(v1)
+    third = document_service.ingest_document(str(path))
+
+    assert first["success"] and second["success"] and third["success"]
+    assert first["chunks_created"] > 1
+    assert second["chunks_created"] > 0  # v2 is new content, not skipped
+    assert third["chunks_created"] == 0  # v1 is skipped as already ingested
+    assert third["document_ids"] == first["document_ids"]
+
+
+def test_failed_ingest_keeps_chunks_of_earlier_version(stored_objects, monkeypatch, tmp_path):
+    v1, v2 = _versions()
+    path = tmp_path / "doc.txt"
+
+    path.write_text(v1)
+    first = document_service.ingest_document(str(path))
+
+    # Store v2's chunks, then fail as a partial write would
+    add_documents = weaviate_client.add_documents
+
+    def add_then_fail(documents, vectors):
+        add_documents(documents, vectors)
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(weaviate_client, "add_documents", add_then_fail)
+    path.write_text(v2)
+    assert not document_service.ingest_document(str(path))["success"]
+
+    assert sorted(stored_objects) == sorted(first["document_ids"])
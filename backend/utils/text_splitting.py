@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
+
+from app.config import settings
+
+# Splitter used inside worker processes, built once per process by the pool initializer
+_worker_splitter = None
+
+
+def build_text_splitter() -> RecursiveCharacterTextSplitter:
+    """Create the token-based recursive splitter used for chunking"""
+    # Measure chunks in tokens with tiktoken (Rust) rather than Python-level character counts
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name="cl100k_base",
+        chunk_size=settings.chunk_size,
+        chunk_overlap=settings.chunk_overlap,
+    )
+
+
+def _init_worker():
+    """Build the worker's splitter once instead of pickling one with every task"""
+    global _worker_splitter
+    _worker_splitter = build_text_splitter()
+
+
+def _split_in_worker(document: Document) -> List[Document]:
+    """Split a single document inside a worker process"""
+    return _worker_splitter.split_documents([document])
+
+
+@lru_cache(maxsize=1)
+def get_split_executor() -> ProcessPoolExecutor:
+    """Get the shared process pool used for splitting large documents"""
+    # Spawn rather than fork: the pool is created lazily from a worker thread of a process
+    # that already holds Weaviate gRPC channels and other threads
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker
+    )
+
+
+def split_documents_parallel(documents: List[Document]) -> List[Document]:
+    """Split documents across CPU cores, keeping chunks in document order"""
+    chunk_lists = get_split_executor().map(_split_in_worker, documents, chunksize=4)
+    return [chunk for chunks in chunk_lists for chunk in chunks]
@@ -52,9 +52,11 @@ else
     docker run -d \
         --name weaviate-rag \
         -p 8080:8080 \
+        -p 50051:50051 \
         -e QUERY_DEFAULTS_LIMIT=25 \
         -e AUTHENTICATION_ANONYMOUS_ACCESS_ENABLED=true \
         -e PERSISTENCE_DATA_PATH='/var/lib/weaviate' \
+        -e ASYNC_INDEXING=true \
         semitechnologies/weaviate:latest
     
     echo "⏳ Waiting for Weaviate to start..."